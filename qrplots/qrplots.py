@@ -1,11 +1,36 @@
 
-import copy
 import matplotlib
+import matplotlib.colors
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+import matplotlib.collections as collections
+import functools
+import numpy as np
 import qrcode
 
 
+"""
+It encodes a text as a QR matrix. Results are cached, so the returned matrix is read-only.
+
+:param text: text to encode.
+:param error_correction: error correction level.
+:returns: int8 QR matrix.
+"""
+@functools.lru_cache(maxsize=128)
+def _build_matrix(text, error_correction):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=error_correction,
+        box_size=10,
+        border=0,
+    )
+    qr.add_data(text)
+    qr.make(fit=True)
+    data = np.where(qr.get_matrix(), QRPlots.C_FRONT, QRPlots.C_BACK).astype(np.int8)
+    data.flags.writeable = False
+    return data
+
+
 class QRPlots:
     C_BACK = 0
     C_FRONT = 1
@@ -15,31 +40,34 @@ class QRPlots:
 
     PLT_COLORS = ('white', 'black', '#bdc3c7', '#2c3e50', '#4cd137', 'magenta', 'yellow')
 
-    MASKS = {0: lambda i, j: (i * j) % 2 + (i * j) % 3 == 0,
-             1: lambda i, j: (i // 2 + j // 3) % 2 == 0,
-             2: lambda i, j: ((i * j) % 3 + i + j) % 2 == 0,
-             3: lambda i, j: ((i * j) % 3 + i * j) % 2 == 0,
-             4: lambda i, j: i % 2 == 0,
-             5: lambda i, j: (i + j) % 2 == 0,
-             6: lambda i, j: (i + j) % 3 == 0,
-             7: lambda i, j: j % 3 == 0}
+    _CMAP2 = matplotlib.colors.ListedColormap(PLT_COLORS[:2], name='colors')
+    _CMAP3 = matplotlib.colors.ListedColormap(PLT_COLORS[:3], name='colors')
+    _CMAP4 = matplotlib.colors.ListedColormap(PLT_COLORS[:4], name='colors')
+    _CMAP5 = matplotlib.colors.ListedColormap(PLT_COLORS[:5], name='colors')
+
+    _MASK_VEC = {0: lambda I, J: ((I * J) % 2 + (I * J) % 3) == 0,
+                 1: lambda I, J: ((I // 2 + J // 3) % 2) == 0,
+                 2: lambda I, J: (((I * J) % 3 + I + J) % 2) == 0,
+                 3: lambda I, J: (((I * J) % 3 + I * J) % 2) == 0,
+                 4: lambda I, J: (I % 2) == 0,
+                 5: lambda I, J: ((I + J) % 2) == 0,
+                 6: lambda I, J: ((I + J) % 3) == 0,
+                 7: lambda I, J: (J % 3) == 0}
+
+    MASKS = _MASK_VEC
 
     def __init__(self, qr_text, error_correction=qrcode.constants.ERROR_CORRECT_L):
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=error_correction,
-            box_size=10,
-            border=0,
-        )
-        qr.add_data(qr_text)
-        qr.make(fit=True)
-        qr_data = qr.get_matrix()
-        self.data = []
-        for row in qr_data:
-            self.data.append([QRPlots.C_FRONT if val else QRPlots.C_BACK for val in row])
+        self.data = _build_matrix(qr_text, error_correction).copy()
+        self._n = len(self.data)
+        self._bits = np.packbits(self.data == QRPlots.C_FRONT, axis=1)
+        self._indices = np.indices(self.data.shape, dtype=np.int32)
+        self._mask_id = None
+        self._cfg_template = self._color_cfg_pixels()
+        self._cfg_template.flags.writeable = False
 
         self.data_rev = self._reverse_mask()
         self.text = qr_text
+        self._fig = self._ax = None
 
         assert self.codification_mode() == 4, "Only codification mode 4 is supported (byte encoding). \
                                                Please, provide only ascii text."
@@ -48,36 +76,23 @@ class QRPlots:
     It colors the fixed QR pixels. These pixels are normally used as reference to read the code.
     
     :param data: matrix containing QR data
+    :param copy: to work over a copy of data. If not set, data is colored in place.
     :returns: resulting QR matrix.
     """
-    def _color_fixed_pixels(self, data=None):
-        data = copy.deepcopy(self.data) if data is None else copy.deepcopy(data)
-
-        for i in range(8):
-            data[i][:8] = [QRPlots.C_FIX_FRONT
-                           if val == QRPlots.C_FRONT
-                           else QRPlots.C_FIX_BACK
-                           for val in data[i][:8]]
-
-            data[i][-8:] = [QRPlots.C_FIX_FRONT
-                            if val == QRPlots.C_FRONT
-                            else QRPlots.C_FIX_BACK
-                            for val in data[i][-8:]]
-
-            data[-8 + i][:8] = [QRPlots.C_FIX_FRONT
-                                if val == QRPlots.C_FRONT
-                                else QRPlots.C_FIX_BACK
-                                for val in data[-8 + i][:8]]
-
-        data[6][8:-8] = [QRPlots.C_FIX_FRONT
-                         if val == QRPlots.C_FRONT
-                         else QRPlots.C_FIX_BACK
-                         for val in data[6][8:-8]]
-
-        for i in range(8, len(data) - 8):
-            data[i][6] = QRPlots.C_FIX_FRONT \
-                if data[i][6] == QRPlots.C_FRONT \
-                else QRPlots.C_FIX_BACK
+    def _color_fixed_pixels(self, data=None, copy=True):
+        if data is None:
+            data = self.data.copy()
+        elif copy:
+            data = data.copy()
+
+        def recolor(block):
+            block[...] = np.where(block == QRPlots.C_FRONT, QRPlots.C_FIX_FRONT, QRPlots.C_FIX_BACK)
+
+        recolor(data[:8, :8])
+        recolor(data[:8, -8:])
+        recolor(data[-8:, :8])
+        recolor(data[6:7, 8:-8])
+        recolor(data[8:-8, 6:7])
 
         data[-8][8] = QRPlots.C_FIX_FRONT
         return data
@@ -87,28 +102,23 @@ class QRPlots:
     
     :param data: matrix containing QR data.
     :param hide_rb: to hide also the length and encoding mode pixels.
+    :param copy: to work over a copy of data. If not set, data is colored in place.
     :returns: resulting QR matrix.
     """
-    def _color_cfg_pixels(self, data=None, hide_rb=False):
-        data = copy.deepcopy(self.data) if data is None else copy.deepcopy(data)
-
-        for i in range(9):
-            data[i][:9] = [QRPlots.C_FIX_BACK] * 9
-            data[i][-8:] = [QRPlots.C_FIX_BACK] * 8
-            if i < 8:
-                data[-8 + i][:8] = [QRPlots.C_FIX_BACK] * 8
-
-        data[6][8:-8] = [QRPlots.C_FIX_BACK] * (len(data) - 16)
-
-        for i in range(9, len(data) - 8):
-            data[i][6] = QRPlots.C_FIX_BACK
-
-        for i in range(8):
-            data[-8 + i][8] = QRPlots.C_FIX_BACK
+    def _color_cfg_pixels(self, data=None, hide_rb=False, copy=True):
+        if data is None:
+            data = self.data.copy()
+        elif copy:
+            data = data.copy()
+
+        data[:9, :9] = QRPlots.C_FIX_BACK
+        data[:9, -8:] = QRPlots.C_FIX_BACK
+        data[-8:, :9] = QRPlots.C_FIX_BACK
+        data[6, 8:-8] = QRPlots.C_FIX_BACK
+        data[9:-8, 6] = QRPlots.C_FIX_BACK
 
         if hide_rb:
-            for i in range(6):
-                data[-6 + i][-2:] = [QRPlots.C_FIX_BACK] * 2
+            data[-6:, -2:] = QRPlots.C_FIX_BACK
 
         return data
 
@@ -123,18 +133,13 @@ class QRPlots:
     def _color_mask(self, show_data=False, mask_id=None):
         if mask_id is None:
             mask_id = self.mask_id()
-        data = self._color_cfg_pixels()
-        mask_fun = QRPlots.MASKS[mask_id]
-
-        for i in range(len(data)):
-            for j in range(len(data[0])):
-                if data[i][j] == QRPlots.C_FIX_BACK:
-                    continue
+        data = self._cfg_template.copy()
+        mask = QRPlots._MASK_VEC[mask_id](*self._indices)
+        free = data != QRPlots.C_FIX_BACK
 
-                if mask_fun(i, j):
-                    data[i][j] = QRPlots.C_MASK
-                elif not show_data:
-                    data[i][j] = QRPlots.C_BACK
+        data[mask & free] = QRPlots.C_MASK
+        if not show_data:
+            data[~mask & free] = QRPlots.C_BACK
 
         return data
 
@@ -148,18 +153,22 @@ class QRPlots:
     def _reverse_mask(self, mask_id=None):
         if mask_id is None:
             mask_id = self.mask_id()
-        data = copy.deepcopy(self.data)
-        mask = self._color_mask(mask_id=mask_id)
+        mask = QRPlots._MASK_VEC[mask_id](*self._indices)
+        mask &= self._cfg_template != QRPlots.C_FIX_BACK
 
-        for i in range(len(mask)):
-            for j in range(len(mask[0])):
-                if mask[i][j] == QRPlots.C_MASK:
-                    data[i][j] = QRPlots.C_BACK if data[i][j] == QRPlots.C_FRONT else QRPlots.C_FRONT
+        return self._unpack(self._bits ^ np.packbits(mask, axis=1))
 
-        return data
+    """
+    It expands a bit-packed QR matrix, with one bit per pixel along the rows.
+
+    :param bits: packed QR data, as returned by np.packbits.
+    :returns: resulting QR matrix.
+    """
+    def _unpack(self, bits):
+        return np.where(np.unpackbits(bits, axis=1, count=self._n), QRPlots.C_FRONT, QRPlots.C_BACK).astype(np.int8)
 
     def _color_error_pixels(self):
-        data = self._color_cfg_pixels(self._reverse_mask())
+        data = self._color_cfg_pixels(self._reverse_mask(), copy=False)
         for byte in self._iter_bytes(data, limit=self.msg_len()):
             print(byte, chr(int(byte, 2)))
 
@@ -250,26 +259,51 @@ class QRPlots:
     :returns: Mask ID contained in the configuration pixels. 
     """
     def mask_id(self):
-        return int("".join(('1' if val == QRPlots.C_FRONT else '0' for val in self.data[8][2:5])), 2)
+        if self._mask_id is None:
+            row = self.data[8]
+            self._mask_id = (int(row[2] == QRPlots.C_FRONT) << 2) \
+                | (int(row[3] == QRPlots.C_FRONT) << 1) \
+                | int(row[4] == QRPlots.C_FRONT)
+        return self._mask_id
 
     """
     :returns: Length of the message contained in the QR.
     """
     def msg_len(self):
-        len_bin = ""
+        length = 0
         for i in range(4):
-            len_bin += "".join(map(str, self.data_rev[-6+i][-2:]))
+            length |= int(self.data_rev[-6 + i, -2]) << (2 * i)
+            length |= int(self.data_rev[-6 + i, -1]) << (2 * i + 1)
 
-        return int(len_bin[::-1], 2)
+        return length
 
     """
     :returns: Codification mode.
     """
     def codification_mode(self):
-        cod_mode = "".join(map(str, self.data_rev[-2][-2:]))
-        cod_mode += "".join(map(str, self.data_rev[-1][-2:]))
+        d = self.data_rev
+        return int(d[-2, -2]) | (int(d[-2, -1]) << 1) | (int(d[-1, -2]) << 2) | (int(d[-1, -1]) << 3)
+
+    """
+    It draws a QR matrix, reusing the figure of the previous plot if it is still open and has the same size.
 
-        return int(cod_mode[::-1], 2)
+    :param data: matrix containing QR data.
+    :param cmap: colormap used to draw the matrix.
+    :param size: size in inches of the resulting image.
+    :returns: axes where the matrix has been drawn.
+    """
+    def _matshow(self, data, cmap, size):
+        if self._fig is None or not plt.fignum_exists(self._fig.number) \
+                or tuple(self._fig.get_size_inches()) != (size, size):
+            if self._fig is not None:
+                plt.close(self._fig)
+            self._fig, self._ax = plt.subplots(figsize=(size, size))
+        else:
+            self._ax.clear()
+            plt.figure(self._fig.number)
+
+        self._ax.matshow(data, cmap=cmap)
+        return self._ax
 
     """
     Shows the original QR code.
@@ -277,10 +311,9 @@ class QRPlots:
     :param size: size in inches of the resulting image.
     """
     def plot(self, size=8):
-        cmap = matplotlib.colors.ListedColormap(QRPlots.PLT_COLORS[:2], name='colors', N=None)
+        cmap = QRPlots._CMAP2
 
-        fig, ax = plt.subplots(figsize=(size, size))
-        ax.matshow(self.data, cmap=cmap)
+        self._matshow(self.data, cmap, size)
         plt.show()
 
     """
@@ -293,51 +326,39 @@ class QRPlots:
     """
     def plot_cfg_info(self, size=8, linewidth=3, off=0.5, off2=0.1):
         data = self._color_fixed_pixels()
-        cmap = matplotlib.colors.ListedColormap(QRPlots.PLT_COLORS[:4], name='colors', N=None)
-
-        fig, ax = plt.subplots(figsize=(size, size))
-        ax.matshow(data, cmap=cmap)
-
-        # Error correction level
-        ax.add_patch(patches.Rectangle((0 - off + off2, 8 - off), 2 - off2, 1, linewidth=linewidth, edgecolor='r',
-                                       facecolor='none'))
-        ax.add_patch(
-            patches.Rectangle((8 - off, len(data) - 2 - off + off2), 1, 2 - off2, linewidth=linewidth, edgecolor='r',
-                              facecolor='none'))
-
-        # Mask pattern
-        ax.add_patch(patches.Rectangle((2 - off + off2, 8 - off), 3 - off2, 1, linewidth=linewidth, edgecolor='g',
-                                       facecolor='none'))
-        ax.add_patch(
-            patches.Rectangle((8 - off, len(data) - 5 - off + off2), 1, 3 - off2, linewidth=linewidth, edgecolor='g',
-                              facecolor='none'))
-
-        # Format error correction
-        ax.add_patch(patches.Rectangle((5 - off + off2, 8 - off), 1 - off2, 1, linewidth=linewidth, edgecolor='#e056fd',
-                                       facecolor='none'))
-        ax.add_patch(
-            patches.Rectangle((7 - off, 8 - off), 1, 1, linewidth=linewidth, edgecolor='#e056fd', facecolor='none'))
-        ax.add_patch(patches.Rectangle((8 - off, len(data) - 7 - off), 1, 2, linewidth=linewidth, edgecolor='#e056fd',
-                                       facecolor='none'))
-        ax.add_patch(
-            patches.Rectangle((8 - off, 0 - off + off2), 1 - off2, 6 - off2, linewidth=linewidth, edgecolor='#e056fd',
-                              facecolor='none'))
-        ax.add_patch(
-            patches.Rectangle((8 - off, 7 - off + off2), 1 - off2, 2 - off2, linewidth=linewidth, edgecolor='#e056fd',
-                              facecolor='none'))
-        ax.add_patch(
-            patches.Rectangle((len(data) - 8 - off, 8 - off), 8 - off2, 1, linewidth=linewidth, edgecolor='#e056fd',
-                              facecolor='none'))
-
-        # Encoding mode
-        ax.add_patch(
-            patches.Rectangle((len(data) - 2 - off, len(data) - 2 - off), 2 - off2, 2 - off2, linewidth=linewidth,
-                              edgecolor='#7ed6df', facecolor='none'))
-
-        # Message length
-        ax.add_patch(
-            patches.Rectangle((len(data) - 2 - off, len(data) - 6 - off), 2 - off2, 4 - off2, linewidth=linewidth,
-                              edgecolor='#f0932b', facecolor='none'))
+        cmap = QRPlots._CMAP4
+
+        ax = self._matshow(data, cmap, size)
+
+        n = len(data)
+        rects = [
+            # Error correction level
+            ((0 - off + off2, 8 - off), 2 - off2, 1, 'r'),
+            ((8 - off, n - 2 - off + off2), 1, 2 - off2, 'r'),
+
+            # Mask pattern
+            ((2 - off + off2, 8 - off), 3 - off2, 1, 'g'),
+            ((8 - off, n - 5 - off + off2), 1, 3 - off2, 'g'),
+
+            # Format error correction
+            ((5 - off + off2, 8 - off), 1 - off2, 1, '#e056fd'),
+            ((7 - off, 8 - off), 1, 1, '#e056fd'),
+            ((8 - off, n - 7 - off), 1, 2, '#e056fd'),
+            ((8 - off, 0 - off + off2), 1 - off2, 6 - off2, '#e056fd'),
+            ((8 - off, 7 - off + off2), 1 - off2, 2 - off2, '#e056fd'),
+            ((n - 8 - off, 8 - off), 8 - off2, 1, '#e056fd'),
+
+            # Encoding mode
+            ((n - 2 - off, n - 2 - off), 2 - off2, 2 - off2, '#7ed6df'),
+
+            # Message length
+            ((n - 2 - off, n - 6 - off), 2 - off2, 4 - off2, '#f0932b'),
+        ]
+
+        ax.add_collection(collections.PatchCollection(
+            [patches.Rectangle(xy, width, height) for xy, width, height, _ in rects],
+            edgecolors=[color for _, _, _, color in rects], linewidths=linewidth, facecolors='none',
+            joinstyle='miter', match_original=False))
 
         plt.show()
 
@@ -347,11 +368,10 @@ class QRPlots:
     :param size: size in inches of the resulting image.
     """
     def plot_fixed(self, size=8):
-        data = self._color_cfg_pixels()
-        cmap = matplotlib.colors.ListedColormap(QRPlots.PLT_COLORS[:3], name='colors', N=None)
+        data = self._cfg_template
+        cmap = QRPlots._CMAP3
 
-        fig, ax = plt.subplots(figsize=(size, size))
-        ax.matshow(data, cmap=cmap)
+        self._matshow(data, cmap, size)
         plt.show()
 
     """
@@ -361,10 +381,9 @@ class QRPlots:
     """
     def plot_mask(self, size=8, show_data=False, mask_id=None):
         data = self._color_mask(show_data, mask_id)
-        cmap = matplotlib.colors.ListedColormap(QRPlots.PLT_COLORS[:5], name='colors', N=None)
+        cmap = QRPlots._CMAP5
 
-        fig, ax = plt.subplots(figsize=(size, size))
-        ax.matshow(data, cmap=cmap)
+        self._matshow(data, cmap, size)
         plt.show()
 
     """
@@ -374,15 +393,14 @@ class QRPlots:
     :param grid: shows a grid over the QR code.
     """
     def plot_reversed(self, size=8, grid=True):
-        cmap = matplotlib.colors.ListedColormap(QRPlots.PLT_COLORS[:3], name='colors', N=None)
+        cmap = QRPlots._CMAP3
 
-        fig, ax = plt.subplots(figsize=(size, size))
-        ax.matshow(self._color_cfg_pixels(self.data_rev), cmap=cmap)
+        ax = self._matshow(self._color_cfg_pixels(self.data_rev), cmap, size)
 
         if grid:
-            plt.gca().set_xticks([x - 0.5 for x in range(len(self.data_rev))], minor='true')
-            plt.gca().set_yticks([y - 0.55 for y in range(len(self.data_rev))], minor='true')
-            plt.grid(which='minor')
+            ax.set_xticks([x - 0.5 for x in range(len(self.data_rev))], minor='true')
+            ax.set_yticks([y - 0.55 for y in range(len(self.data_rev))], minor='true')
+            ax.grid(which='minor')
 
         plt.show()
 
@@ -12,5 +12,6 @@ setup(
     description='',
     install_requires=[
           'qrcode[pil]',
+          'numpy',
       ],
 )